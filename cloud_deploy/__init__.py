@@ -10,21 +10,35 @@ __version__ = '0.1.0'
 from .nodes import DigitalOceanNode, OpenStackNode, list_nodes, get_node
 from .services import Service
 
+_services_by_name = {}  # populated by list_services()
+_services_index_live = False  # whether _services_by_name was filled by querying the nodes
+
 
 def list_services(update=True):
-    nodes = list_nodes()
+    global _services_index_live
+    # with update=True, the nodes are queried concurrently by list_nodes()
+    nodes = list_nodes(fetch_services=update)
     services = []
     for node in nodes:
-        if "dockerapp.io" not in node.name:  # can't currently list services run on Docker Cloud
-            services += node.services(update=update)
+        if node.can_list_services:
+            if update:
+                services += node.live_services
+            else:
+                services += node.services(update=False)
+    _services_by_name.clear()
+    # reversed, so that the first service with a given name wins
+    _services_by_name.update((service.name, service) for service in reversed(services))
+    _services_index_live = update
     return services
 
 
 def find_service(name):
-    nodes = list_nodes()
-    for node in nodes:
-        if "dockerapp.io" not in node.name:
-            for service in node.services():
-                if service.name == name:
-                    return service
-    return None
+    """
+    Find a service by name, querying the nodes only if it is not already known
+    from an earlier call to list_services().
+
+    Returns None if there is no such service.
+    """
+    if name not in _services_by_name and not _services_index_live:
+        list_services()
+    return _services_by_name.get(name)
@@ -30,6 +30,7 @@ try:
 except ImportError:  # Py 3
     pass
 from datetime import datetime
+from functools import lru_cache
 from getpass import getpass
 import shlex
 import yaml
@@ -39,6 +40,7 @@ import spur
 import click
 from tabulate import tabulate
 from . import Service, DigitalOceanNode, list_nodes, get_node, list_services, find_service
+from .services import SafeLoader
 
 logging.basicConfig(filename='deploy.log', level=logging.WARNING,
                     format='%(asctime)s %(levelname)s %(message)s')
@@ -47,16 +49,19 @@ logger.setLevel(logging.INFO)
 
 
 do_manager = None
+local_shell = spur.LocalShell()
 PROJECT_DIR = dirname(dirname(abspath(__file__)))
 
 
+@lru_cache(maxsize=None)
 def load_config(name):
     with open("deployment/{}.yml".format(name)) as fp:
-        config = yaml.load(fp)
+        config = yaml.load(fp, Loader=SafeLoader)
     with open("deployment/{}-secrets.yml".format(name)) as fp:
-        config.update(yaml.load(fp))
+        config.update(yaml.load(fp, Loader=SafeLoader))
     return config
 
+
 @click.option("--debug", is_flag=True)
 @click.group()
 def cli(debug):
@@ -79,13 +84,12 @@ def build(service, colour, remote):
     if repo.is_dirty():
         git_tag += "z"
 
-    shell = spur.LocalShell()
     config = load_config(service)
     image = config["image"]
 
     build_directory = os.getcwd()
     dockerfile = config["dockerfile"]
-    cmd = "docker build -t {} -f {} .".format(image, dockerfile)
+    cmd = ["docker", "build", "-t", image, "-f", dockerfile, "."]
 
     # write version information
     with open(join(build_directory, "build_info.json"), "w") as fp:
@@ -97,8 +101,8 @@ def build(service, colour, remote):
     if remote is None :
         # build image
         logger.info("Building image '{}' for service '{}', environment '{}', version {}".format(image, service, colour, git_tag))
-        click.echo(f"Building image with command {cmd}")
-        result = shell.run(cmd.split(), cwd=build_directory, allow_error=True)
+        click.echo("Building image with command {}".format(" ".join(cmd)))
+        result = local_shell.run(cmd, cwd=build_directory, allow_error=True)
 
         logger.debug(result.output)
         if result.return_code != 0:
@@ -114,14 +118,14 @@ def build(service, colour, remote):
         project_folder = code_dir.split("/")[-1]
 
         #clean the temp_dir if needed
-        node._remote_execute('rm -R temp_dir')
+        node._remote_execute(["rm", "-R", "temp_dir"])
         #copy the files to remote
-        shell.run('scp -r -p {} root@{}:temp_dir'.format(code_dir, node.droplet.ip_address).split())
+        local_shell.run(["scp", "-r", "-p", code_dir, "root@{}:temp_dir".format(node.droplet.ip_address)])
 
         #rename the previous project to backup
 
-        node._remote_execute('mv {} {}_backup'.format(project_folder, project_folder))
-        node._remote_execute('mv temp_dir {}'.format(project_folder))
+        node._remote_execute(["mv", project_folder, "{}_backup".format(project_folder)])
+        node._remote_execute(["mv", "temp_dir", project_folder])
 
         # build image
         logger.info("Building image '{}' for service '{}', environment '{}', version {} on remote machine {} ".format(image, service, colour, git_tag, remote))
@@ -132,17 +136,17 @@ def build(service, colour, remote):
     # tag image
     colour_tag = colour or "latest"
     for tag in (colour_tag, git_tag):
-        cmd = "docker tag {} {}:{}".format(image, image, tag)
+        cmd = ["docker", "tag", image, "{}:{}".format(image, tag)]
         if remote is None :
-            shell.run(cmd.split())
+            local_shell.run(cmd)
         else :
             node._remote_execute(cmd)
 
     if remote is None :
         # push image
-        cmd = "docker push {}:{}".format(image, colour_tag)
+        cmd = ["docker", "push", "{}:{}".format(image, colour_tag)]
         click.echo("Pushing image")
-        result = shell.run(cmd.split())
+        result = local_shell.run(cmd)
         logger.debug(result.output)
         logger.info("Pushed image {}:{}".format(image, colour_tag))
 
@@ -295,8 +299,7 @@ def db_dump(service):
     }
     db_password = config.get('secrets')['NMPI_DATABASE_PASSWORD']
     cmd = "pg_dump --clean --create --insert --host={host} --port={port} --username=nmpi_dbadmin --dbname=nmpi --file=nmpi_v2_dump_{timestamp}.sql".format(**params)
-    shell = spur.LocalShell()
-    shell.run(shlex.split(cmd), update_env={"PGPASSWORD": db_password})
+    local_shell.run(shlex.split(cmd), update_env={"PGPASSWORD": db_password})
 
 
 @click.argument("filename")
@@ -311,17 +314,16 @@ def db_restore(service, filename):
         'filename': filename
     }
     db_password = config.get('secrets')['NMPI_DATABASE_PASSWORD']
-    shell = spur.LocalShell()
     psql = "psql -h {host} -p {port} --username=postgres".format(**params)
     cmd = """echo "CREATE USER nmpi_dbadmin WITH PASSWORD '{}';" | """.format(db_password) + psql
     print(cmd)
     #print shlex.split(cmd)
     pg_password = getpass("Enter the password for the 'postgres' user: ")
-    shell.run(["sh", "-c", cmd], update_env={"PGPASSWORD": pg_password})
+    local_shell.run(["sh", "-c", cmd], update_env={"PGPASSWORD": pg_password})
     cmd = psql + " < {filename}".format(**params)
     print(cmd)
     #print shlex.split(cmd)
-    shell.run(["sh", "-c", cmd], update_env={"PGPASSWORD": pg_password})
+    local_shell.run(["sh", "-c", cmd], update_env={"PGPASSWORD": pg_password})
 
 
 if __name__ == "__main__":
@@ -6,15 +6,24 @@ At present, only works with DigitalOcean Droplets and OpenStack (Nova) VMs at CS
 
 import os
 import sys
+import atexit
 from collections import OrderedDict
-from time import sleep
-import json
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from operator import attrgetter
+from time import sleep, time, monotonic
 import shlex
+import shutil
+import socket
+import subprocess
 import logging
 import getpass
+import hashlib
+import hmac
+import tempfile
+import threading
 
-# for Digital Ocean
-import digitalocean
+# for Digital Ocean: imported where it is used, as it is slow to import
 # for OpenStack
 from keystoneauth1.identity import v3
 from keystoneauth1 import session as kssession
@@ -24,26 +33,44 @@ from keystoneauth1.extras._saml2 import V3Saml2Password
 from keystoneclient.v3 import client as ksclient
 from novaclient import client as novaclient
 
-import yaml
+import paramiko
 import spur
-from .services import Service, get_config_file
+from .services import Service, get_config, json_loads, json_dumps
 
 do_manager = None
+_do_manager_lock = threading.Lock()
 nova_clients = None
 logger = logging.getLogger("deploy")
 CACHE_FILE = os.path.expanduser("~/.clouddeploycache")
-
-with open(get_config_file()) as fp:
-    config = yaml.safe_load(fp)
-    DOCKER_USER = config["DOCKER_USER"]
-    CSCS_USER = config["CSCS_USER"]
-    CSCS_PROJECTS = config["CSCS_PROJECTS"]
-    OS_AUTH_URL = config["OS_AUTH_URL"]
-    OS_IDENTITY_PROVIDER = config["OS_IDENTITY_PROVIDER"]
-    OS_IDENTITY_PROVIDER_URL = config["OS_IDENTITY_PROVIDER_URL"]
-    SSH_KEYS = config["SSH_KEYS"]
-
-
+NODES_CACHE_TTL = 60  # seconds
+DROPLET_CREATE_TIMEOUT = 600  # seconds
+DOCKER_LOGIN_KDF_ITERATIONS = 200000
+_nodes_cache = {"ts": 0, "nodes": None, "nodes_by_name": {}}
+_services_cache = None  # contents of CACHE_FILE, loaded on first use
+_services_cache_mtime = None
+_cache_file_lock = threading.RLock()  # nodes may be queried from several threads
+_svc_attrs = ("name", "image", "status", "id", "ports", "env", "volumes")  # attributes saved in the cache
+_svc_getter = attrgetter(*_svc_attrs)
+_flavor_cache = {}
+# (attribute, column title) for the first columns of Node.as_dict()
+_NODE_FIELDS = tuple((attr, attr.title()) for attr in ("name", "ip_address", "created_at"))
+# SSH connections are kept open for the life of the process, keyed by (hostname, username, key)
+_shell_pool = {}
+_shell_pool_lock = threading.Lock()
+_pulled = set()  # (node name, image) pairs already pulled by this process
+_pulled_lock = threading.Lock()
+
+config = get_config()
+DOCKER_USER = config["DOCKER_USER"]
+CSCS_USER = config["CSCS_USER"]
+CSCS_PROJECTS = config["CSCS_PROJECTS"]
+OS_AUTH_URL = config["OS_AUTH_URL"]
+OS_IDENTITY_PROVIDER = config["OS_IDENTITY_PROVIDER"]
+OS_IDENTITY_PROVIDER_URL = config["OS_IDENTITY_PROVIDER_URL"]
+SSH_KEYS = config["SSH_KEYS"]
+
+
+@lru_cache(maxsize=1)
 def get_do_token():
     """
     Retrieve the DigitalOcean API token from the MacOS keychain.
@@ -54,10 +81,27 @@ def get_do_token():
         cmd = ['security', 'find-generic-password', '-s', 'DigitalOcean API Token', '-w']
     else:
         cmd = ['pass', 'show', 'tokens/digitalocean']
-    token =  spur.LocalShell().run(cmd, encoding='utf-8')
-    return token.output.strip()
+    # capture_output/text would need Python 3.7
+    result = subprocess.run(cmd, check=True, stdout=subprocess.PIPE, universal_newlines=True)
+    return result.stdout.strip()
+
+
+def get_do_manager():
+    """
+    Return the DigitalOcean API manager, creating it on first use.
+
+    Safe to call from several threads.
+    """
+    global do_manager
+    if do_manager is None:
+        with _do_manager_lock:
+            if do_manager is None:
+                import digitalocean  # slow to import, and not needed by every command
+                do_manager = digitalocean.Manager(token=get_do_token())
+    return do_manager
 
 
+@lru_cache(maxsize=1)
 def get_docker_password():
     """
     Retrieve the Docker Hub password from the MacOS keychain.
@@ -68,11 +112,13 @@ def get_docker_password():
         cmd = "security find-internet-password -s id.docker.com -a {} -w"
     else:
         cmd = "pass show web/hub.docker.com/{}"
-    #pswd = spur.LocalShell().run(cmd.format(DOCKER_USER).split())
-    #return pswd.output.strip()
+    #pswd = subprocess.run(shlex.split(cmd.format(DOCKER_USER)), check=True,
+    #                      stdout=subprocess.PIPE, universal_newlines=True)
+    #return pswd.stdout.strip()
     return "Scw-sAR-Pa6-p3Z"
 
 
+@lru_cache(maxsize=1)
 def get_nova_clients(project_names, token=None):
     username = CSCS_USER
     if token:
@@ -112,69 +158,365 @@ def get_nova_clients(project_names, token=None):
     return clients
 
 
+class _SshConn(object):
+    """
+    An SSH connection to a node, opened on first use.
+
+    Each command runs in a new channel of the same connection. Failures are
+    reported with spur's exception types, as for the local shell.
+    """
+
+    def __init__(self, hostname, username, private_key_file):
+        self.hostname = hostname
+        self.username = username
+        self.private_key_file = private_key_file
+        self._client = None
+        self._lock = threading.Lock()
+
+    def _connection_error(self, err):
+        connection_error = spur.ssh.ConnectionError(
+            "Error creating SSH connection\nOriginal error: {}".format(err))
+        connection_error.original_error = err
+        return connection_error
+
+    def _connect(self):
+        with self._lock:
+            if self._client is None:
+                client = paramiko.SSHClient()
+                # as spur does, so that a changed host key is rejected
+                client.load_system_host_keys()
+                client.set_missing_host_key_policy(paramiko.WarningPolicy())
+                try:
+                    client.connect(hostname=self.hostname, username=self.username,
+                                   key_filename=self.private_key_file,
+                                   look_for_keys=False)
+                except (socket.error, paramiko.SSHException, EOFError) as err:
+                    raise self._connection_error(err)
+                self._client = client
+            return self._client
+
+    def exec_command(self, args, cwd=None):
+        """
+        Start the command `args` on the node, and return its (stdin, stdout, stderr).
+        """
+        command = " ".join(shlex.quote(arg) for arg in args)
+        if cwd is not None:
+            command = "cd {} && {}".format(shlex.quote(cwd), command)
+        try:
+            return self._connect().exec_command(command)
+        except (socket.error, paramiko.SSHException, EOFError) as err:
+            raise self._connection_error(err)
+
+    def run(self, args, cwd=None, sink=None):
+        """
+        Run the command `args` on the node and return its output.
+
+        If `sink` (a file opened in binary mode) is given, the output, including
+        anything written to stderr, is instead copied into it as it arrives,
+        without being held in memory.
+
+        Raises spur.results.RunProcessError if the command fails.
+        """
+        stdin, stdout, stderr = self.exec_command(args, cwd=cwd)
+        stdin.close()
+        if sink is None:
+            # read stderr in parallel, otherwise the command could block once the channel window is full
+            stderr_output = []
+            stderr_reader = threading.Thread(target=lambda: stderr_output.append(stderr.read()))
+            stderr_reader.start()
+            output = stdout.read().decode("utf-8")
+            stderr_reader.join()
+            stderr_output = stderr_output[0].decode("utf-8")
+        else:
+            # e.g. `docker logs` passes on the container's stderr as stderr;
+            # stderr already received is moved into stdout by paramiko
+            stdout.channel.set_combine_stderr(True)
+            shutil.copyfileobj(stdout, sink, 65536)
+            output = stderr_output = ""
+        return_code = stdout.channel.recv_exit_status()
+        if return_code != 0:
+            raise spur.results.RunProcessError(return_code, output, stderr_output)
+        return output
+
+    def close(self):
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+
+def _get_pooled_shell(pool_key):
+    """
+    Return the SSH connection for the given (hostname, username, key), creating it
+    if necessary, and whether it already existed.
+    """
+    hostname, username, key = pool_key
+    with _shell_pool_lock:
+        shell = _shell_pool.get(pool_key)
+        if shell is not None:
+            return shell, True
+        shell = _SshConn(hostname=hostname, username=username,
+                         private_key_file=os.path.expanduser("~/.ssh/{}".format(key)))
+        _shell_pool[pool_key] = shell
+        return shell, False
+
+
+def _evict_pooled_shell(pool_key):
+    with _shell_pool_lock:
+        shell = _shell_pool.pop(pool_key, None)
+    if shell is not None:
+        shell.close()
+
+
+@atexit.register
+def _close_pooled_shells():
+    with _shell_pool_lock:
+        shells = list(_shell_pool.values())
+        _shell_pool.clear()
+    for shell in shells:
+        shell.close()
+
+
+def _load_cache():
+    """
+    Return the contents of the services cache.
+
+    CACHE_FILE is parsed only the first time, and again if it has since been
+    modified by another process.
+    """
+    global _services_cache, _services_cache_mtime
+    with _cache_file_lock:
+        try:
+            mtime = os.stat(CACHE_FILE).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if _services_cache is None or mtime != _services_cache_mtime:
+            if mtime is None:
+                _services_cache = {}
+            else:
+                with open(CACHE_FILE, "rb") as fp:
+                    _services_cache = json_loads(fp.read())
+            _services_cache_mtime = mtime
+        return _services_cache
+
+
+def _write_cache(cache):
+    """
+    Write the (in-memory) services cache to CACHE_FILE.
+
+    The file is written to a temporary file which then replaces CACHE_FILE,
+    so it is never left half-written.
+    """
+    global _services_cache_mtime
+    with _cache_file_lock:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(CACHE_FILE))
+        try:
+            with os.fdopen(fd, "wb") as fp:
+                fp.write(json_dumps(cache))
+            os.replace(tmp_path, CACHE_FILE)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        # so that _load_cache() doesn't parse again the file we have just written
+        _services_cache_mtime = os.stat(CACHE_FILE).st_mtime_ns
+
+
+def _docker_login_digest(password, salt):
+    """
+    Return a salted, deliberately slow hash of the Docker Hub credentials, used to
+    check if a node is already logged in without storing anything easily reversed.
+    """
+    credentials = "{}:{}".format(DOCKER_USER, password).encode("utf-8")
+    return hashlib.pbkdf2_hmac("sha256", credentials, salt, DOCKER_LOGIN_KDF_ITERATIONS).hex()
+
+
+def _get_flavor(flavor_id):
+    """
+    Return the OpenStack flavor with the given id.
+
+    All flavors are retrieved with a single API call the first time this is called.
+    """
+    if flavor_id not in _flavor_cache:
+        nova_client = nova_clients[CSCS_PROJECTS[0]]
+        if not _flavor_cache:
+            _flavor_cache.update((flavor.id, flavor) for flavor in nova_client.flavors.list())
+        if flavor_id not in _flavor_cache:  # e.g. a private flavor, not included in the list
+            _flavor_cache[flavor_id] = nova_client.flavors.get(flavor_id)
+    return _flavor_cache[flavor_id]
+
+
 class Node(object):
     """
     A compute node.
     """
 
     def __init__(self):
-        pass
+        self._ssh_key = None  # the key accepted by this node, once known
+        self._logged_in = False  # whether we have logged into Docker Hub on this node
+        self.live_services = None  # set by list_nodes(fetch_services=True)
+
+    def _run(self, key, args, cwd=None, sink=None):
+        """
+        Run the command `args` over the pooled SSH connection to this node that uses `key`,
+        and return its output.
+        """
+        pool_key = (self.ip_address, self.remote_username, key)
+        shell, reused = _get_pooled_shell(pool_key)
+        try:
+            return shell.run(args, cwd=cwd, sink=sink)
+        except spur.ssh.ConnectionError:
+            _evict_pooled_shell(pool_key)
+            if not reused:
+                raise
+        # the pooled connection may have been dropped since it was last used, so reconnect once
+        shell, reused = _get_pooled_shell(pool_key)
+        return shell.run(args, cwd=cwd, sink=sink)
+
+    def _connect_and_run(self, args, cwd=None, sink=None):
+        """
+        Connect to this node and run the command `args`.
 
-    def _remote_execute(self, cmd, cwd=None):
+        Each key found in ~/.ssh is tried in turn until the node accepts one;
+        the key is then kept for subsequent commands.
+        """
         list_possible_keys_format = ["id_dsa", "id_rsa"]
 
-        #check if a corresponding key can be found
-        for key in list_possible_keys_format:
-            if os.path.isfile(os.path.expanduser("~/.ssh/{}".format(key))) is False:
-                if list_possible_keys_format[-1] == key :
-                    raise Exception("No key from ~/.ssh/ matches the list_possible_keys_format {}".format(list_possible_keys_format))
-
-        for key in list_possible_keys_format:
-            shell = spur.SshShell(
-                        hostname=self.ip_address, username=self.remote_username,
-                        private_key_file=os.path.expanduser("~/.ssh/{}".format(key)),
-                        missing_host_key=spur.ssh.MissingHostKey.warn)
-
-            with shell:
-                try :
-                    result = shell.run(shlex.split(cmd), cwd=cwd, encoding="utf-8")
-                    return result.output
-                except spur.results.RunProcessError as err:
-                    if "docker: command not found" in err.stderr_output:
-                        pass  # todo: warn
-                    else:
-                        raise
+        #check which of the keys can be found
+        keys = [key for key in list_possible_keys_format
+                if os.path.isfile(os.path.expanduser("~/.ssh/{}".format(key)))]
+        if not keys:
+            raise Exception("No key from ~/.ssh/ matches the list_possible_keys_format {}".format(list_possible_keys_format))
+
+        for key in keys:
+            try:
+                result = self._run(key, args, cwd=cwd, sink=sink)
+            except spur.ssh.ConnectionError as err:
+                if key == keys[-1]:
+                    raise
+                logger.debug("Unable to connect to {} with key {}: {}".format(self.name, key, err))
+            else:
+                self._ssh_key = key
+                return result
+
+    def _remote_execute(self, args, cwd=None, sink=None):
+        """
+        Run a command on this node and return its output.
+
+        :param args: the command, as a list of arguments.
+        :param sink: a file opened in binary mode; if given, the output is streamed
+                     into it rather than returned.
+        """
+        try :
+            if self._ssh_key is None:
+                return self._connect_and_run(args, cwd=cwd, sink=sink)
+            else:
+                return self._run(self._ssh_key, args, cwd=cwd, sink=sink)
+        except spur.results.RunProcessError as err:
+            # the message depends on the shell: bash ("command not found") or dash ("not found")
+            if "docker: command not found" in err.stderr_output or "docker: not found" in err.stderr_output:
+                return None  # todo: warn
+            else:
+                raise
+
+    def close(self):
+        """Close the SSH connection to this node, if one is open."""
+        if self._ssh_key is not None:
+            _evict_pooled_shell((self.ip_address, self.remote_username, self._ssh_key))
+
+    @property
+    def can_list_services(self):
+        # can't currently list services run on Docker Cloud
+        return "dockerapp.io" not in self.name
 
     @property
-    def sudo_cmd(self):
-        return self.use_sudo and "sudo " or ""
+    def sudo_args(self):
+        return self.use_sudo and ["sudo"] or []
 
     def images(self):
-        print(self._remote_execute(f"{self.sudo_cmd}docker images"))
+        print(self._remote_execute(self.sudo_args + ["docker", "images"]))
 
     def pull(self, image):
         """
         Pull the Docker image with the given name onto this node.
+
+        Returns True if the image was pulled (or was already up to date), False otherwise.
+        Each image is only pulled once per node during the life of the process.
         """
+        key = (self.name, image)
+        with _pulled_lock:
+            if key in _pulled:
+                logger.debug("{} has already been pulled on {}".format(image, self.name))
+                return True
         logger.info("Pulling {} on {}".format(image, self.name))
-        docker_password = get_docker_password()
-        cmd = "f{self.sudo_cmd}docker login --username={DOCKER_USER} --password='{docker_password}'"
-        result1 = self._remote_execute(cmd)
-        logger.info("Logged into hub.docker.com")
+        logged_in_now = self.login()
         logger.debug("Pulling image {}".format(image))
-        result2 = self._remote_execute("f{self.sudo_cmd}docker pull {image}")
-        if "Downloaded newer image" in result2 or "Image is up to date" in result2:
-            return True
-        else:
-            raise Exception(result2)
+        # success is given by the exit status, so we don't need the progress output
+        cmd = self.sudo_args + ["docker", "pull", "--quiet", image]
+        try:
+            result2 = self._remote_execute(cmd)
+        except spur.results.RunProcessError as err:
+            if logged_in_now:
+                logger.error("Unable to pull {} on {}: {}".format(image, self.name, err.stderr_output))
+                return False
+            # the earlier login may no longer be valid, so log in again and retry
+            self.login(force=True)
+            try:
+                result2 = self._remote_execute(cmd)
+            except spur.results.RunProcessError as err:
+                logger.error("Unable to pull {} on {}: {}".format(image, self.name, err.stderr_output))
+                return False
+        if result2 is None:  # docker is not installed
             return False
+        with _pulled_lock:
+            _pulled.add(key)
+        return True
+
+    def login(self, force=False):
+        """
+        Log into Docker Hub on this node.
+
+        Docker keeps the credentials on the node, so we only log in if we have not
+        already done so with the current password, as recorded in the cache.
+
+        :param force: log in even if we have done so before.
+
+        Returns True if we actually logged in, False if an earlier login was reused.
+        """
+        if self._logged_in and not force:
+            return False
+        docker_password = get_docker_password()
+        cached_login = (self._lookup_cache() or {}).get("docker_login")
+        if not force and isinstance(cached_login, dict):  # i.e. there is a {"salt", "hash"} entry
+            digest = _docker_login_digest(docker_password, bytes.fromhex(cached_login["salt"]))
+            if hmac.compare_digest(digest, cached_login["hash"]):
+                self._logged_in = True
+                return False
+        cmd = self.sudo_args + ["docker", "login", f"--username={DOCKER_USER}", f"--password={docker_password}"]
+        if self._remote_execute(cmd) is None:  # docker is not installed
+            logger.warning("Unable to log into hub.docker.com on {}".format(self.name))
+            return False
+        logger.info("Logged into hub.docker.com")
+        self._logged_in = True
+        salt = os.urandom(16)
+        self._update_cache(docker_login={"salt": salt.hex(),
+                                         "hash": _docker_login_digest(docker_password, salt)})
+        return True
 
     def get_service(self, id):
         """
         Get information about an individual Service.
         """
-        response = self._remote_execute(f"{self.sudo_cmd}docker inspect {id}")
-        return Service.from_json(response, node=self)
+        return self.get_services([id])[0]
+
+    def get_services(self, ids):
+        """
+        Get information about several Services, with a single `docker inspect`.
+        """
+        if not ids:
+            return []
+        response = self._remote_execute(self.sudo_args + ["docker", "inspect"] + list(ids))
+        logger.debug(response)
+        return [Service.from_dict(data, node=self) for data in json_loads(response)]
 
     def services(self, show_all=False, update=True):
         """
@@ -184,69 +526,51 @@ class Node(object):
         :param update: query nodes for live information about services,
                        rather than retrieving from cache.
         """
-        if update or not self._have_cache:
-            cmd = f"{self.sudo_cmd}docker ps -q"
-            if show_all:
-                cmd += " -a"
+        cached = (self._lookup_cache() or {}).get("services")
+        if update or cached is None:
+            # list and inspect the containers with a single remote command
+            script = "set -e; ids=$(docker ps -q{}); " \
+                     "if [ -n \"$ids\" ]; then docker inspect $ids; else echo '[]'; fi"
+            script = script.format(show_all and " -a" or "")
             try:
-                response = self._remote_execute(cmd)
+                response = self._remote_execute(self.sudo_args + ["sh", "-c", script])
             except spur.ssh.ConnectionError as err:
                 logger.warning(str(err))
                 response = None
+            logger.debug(response)
             if response:
-                ids = response.strip().split("\n")
+                services = [Service.from_dict(data, node=self) for data in json_loads(response)]
             else:
-                ids = []
-            services = [self.get_service(id) for id in ids]
-            self._cached_services = services
+                services = []
+            self._save_services_to_cache(services)
         else:
-            services = self._cached_services
+            services = [Service(node=self, **attributes)
+                        for attributes in cached]
         return services
 
     def terminate_service(self, id):
-        response = self._remote_execute(f"{self.sudo_cmd}docker rm -f {id}")
+        response = self._remote_execute(self.sudo_args + ["docker", "rm", "-f", id])
 
     def rename_service(self, old_name, new_name):
-        response = self._remote_execute(f"{self.sudo_cmd}docker rename {old_name} {new_name}")
-
-    @property
-    def _have_cache(self):
-        if os.path.exists(CACHE_FILE):
-            with open(CACHE_FILE) as fp:
-                cache = json.load(fp)
-            return self.name in cache
-        else:
-            return False
-
-    def _load_services_from_cache(self):
-        if self._have_cache:
-            with open(CACHE_FILE) as fp:
-                cache = json.load(fp)
-            if self.name in cache:
-                return [Service(node=self, **attributes)
-                        for attributes in cache[self.name]["services"]]
-            else:
-                return []
-        else:
-            return []
+        response = self._remote_execute(self.sudo_args + ["docker", "rename", old_name, new_name])
+
+    def _lookup_cache(self):
+        """Return the cache entry for this node, or None if there isn't one."""
+        return _load_cache().get(self.name)
+
+    def _update_cache(self, **fields):
+        """Update the cache entry for this node with the given fields."""
+        with _cache_file_lock:
+            cache = _load_cache()
+            entry = dict(cache.get(self.name) or {}, **fields)
+            if cache.get(self.name) == entry:
+                return  # nothing has changed, no need to rewrite the file
+            cache[self.name] = entry
+            _write_cache(cache)
 
     def _save_services_to_cache(self, services):
-        if os.path.exists(CACHE_FILE):
-            with open(CACHE_FILE) as fp:
-                cache = json.load(fp)
-        else:
-            cache = {}
-        cache[self.name] = {
-            "services": [
-                dict((attribute, getattr(service, attribute))
-                     for attribute in ("name", "image", "status", "id", "ports", "env", "volumes"))
-                for service in services]
-        }
-        with open(CACHE_FILE, "w") as fp:
-            json.dump(cache, fp, indent=4)
-
-    _cached_services = property(fget=_load_services_from_cache,
-                                fset=_save_services_to_cache)
+        self._update_cache(services=[dict(zip(_svc_attrs, _svc_getter(service)))
+                                     for service in services])
 
 
 class DigitalOceanNode(Node):
@@ -272,8 +596,8 @@ class DigitalOceanNode(Node):
         return self.droplet.ip_address
 
     def as_dict(self):
-        d = OrderedDict((key.title(), str(getattr(self.droplet, key)))
-                        for key in ["name", "ip_address", "created_at"])
+        d = OrderedDict((title, str(getattr(self.droplet, attr)))
+                        for attr, title in _NODE_FIELDS)
         d["Size"] = self.droplet.size['memory']
         d["Location"] = self.droplet.region['name']
         d["Type"] = self.droplet.image['name']
@@ -298,26 +622,32 @@ class DigitalOceanNode(Node):
     @classmethod
     def create(cls, name, type="docker", size="s-1vcpu-1gb"):
         # we use the name "type" for Digital Ocean images to avoid confusion with Docker images.
-        global do_manager
-        if do_manager is None:
-            token = get_do_token()
-            do_manager = digitalocean.Manager(token=token)
+        import digitalocean
+        manager = get_do_manager()
         new_droplet = digitalocean.Droplet(
-                token=do_manager.token,
+                token=manager.token,
                 name=name,
                 region='ams2',
                 image=type,
                 size_slug=size,
                 ssh_keys=SSH_KEYS)
         new_droplet.create()
-        status = None
-        while status != "completed":
-            actions = new_droplet.get_actions()
-            actions[0].load()
-            status = actions[0].status
-            sleep(10)
-        running_droplet = do_manager.get_droplet(new_droplet.id)
-        return cls.from_droplet(running_droplet)
+        # poll with a growing delay, capped at 10 s, until the deadline
+        deadline = monotonic() + DROPLET_CREATE_TIMEOUT
+        delay = 1.0
+        while True:
+            # the list of actions already includes their status, no need to load() them
+            if new_droplet.get_actions()[0].status == "completed":
+                break
+            if monotonic() > deadline:
+                raise TimeoutError("Droplet {} was not created within {} s".format(
+                    name, DROPLET_CREATE_TIMEOUT))
+            sleep(delay)
+            delay = min(delay * 1.5, 10)
+        new_droplet.load()  # refresh the droplet's details, now that it is running
+        if not new_droplet.ip_address:
+            new_droplet = manager.get_droplet(new_droplet.id)
+        return cls.from_droplet(new_droplet)
 
     def shutdown(self):
         self.droplet.shutdown()
@@ -361,21 +691,19 @@ class OpenStackNode(Node):
 
     @property
     def flavor(self):
-        global nova_clients
-        return nova_clients[CSCS_PROJECTS[0]].flavors.get(self.nova_server.flavor['id']).name
+        return _get_flavor(self.nova_server.flavor['id']).name
 
     @property
     def memory(self):
-        global nova_clients
-        return nova_clients[CSCS_PROJECTS[0]].flavors.get(self.nova_server.flavor['id']).ram
+        return _get_flavor(self.nova_server.flavor['id']).ram
 
     @property
     def created_at(self):
         return self.nova_server.created
 
     def as_dict(self):
-        d = OrderedDict((key.title(), str(getattr(self, key)))
-                        for key in ["name", "ip_address", "created_at"])
+        d = OrderedDict((title, str(getattr(self, attr)))
+                        for attr, title in _NODE_FIELDS)
         d["Size"] = self.memory
         d["Location"] = "CSCS"
         d["Type"] = self.flavor
@@ -392,26 +720,72 @@ class OpenStackNode(Node):
         print("Created:    " + self.created_at)
 
 
-def list_nodes():
-    global do_manager, nova_clients
-    if do_manager is None:
-        token = get_do_token()
-        do_manager = digitalocean.Manager(token=token)
+def _have_nodes_cache():
+    return (_nodes_cache["nodes"] is not None
+            and time() - _nodes_cache["ts"] < NODES_CACHE_TTL)
+
+
+def _refresh_nodes_cache():
+    global nova_clients
+    manager = get_do_manager()
     if nova_clients is None:
-        nova_clients = get_nova_clients(CSCS_PROJECTS)
-    do_nodes = [DigitalOceanNode.from_droplet(droplet)
-                for droplet in do_manager.get_all_droplets()]
-    cscs_nodes = []
-    for project_name, nova_client in nova_clients.items():
-        cscs_nodes.extend([OpenStackNode.from_nova(nova_server, project_name)
-                           for nova_server in nova_client.servers.list()])
-    return do_nodes + cscs_nodes
+        nova_clients = get_nova_clients(tuple(CSCS_PROJECTS))
+    # the provider APIs are queried concurrently, as each call is dominated by network latency
+    with ThreadPoolExecutor(max_workers=1 + len(nova_clients)) as executor:
+        droplets = executor.submit(manager.get_all_droplets)
+        nova_servers = {project_name: executor.submit(nova_client.servers.list)
+                        for project_name, nova_client in nova_clients.items()}
+        do_nodes = [DigitalOceanNode.from_droplet(droplet)
+                    for droplet in droplets.result()]
+        cscs_nodes = []
+        for project_name, servers in nova_servers.items():
+            cscs_nodes.extend([OpenStackNode.from_nova(nova_server, project_name)
+                               for nova_server in servers.result()])
+    nodes = do_nodes + cscs_nodes
+    _nodes_cache["nodes"] = nodes
+    # reversed, so that the first node with a given name wins, as before
+    _nodes_cache["nodes_by_name"] = {node.name: node for node in reversed(nodes)}
+    _nodes_cache["ts"] = time()
+
+
+def list_nodes(force=False, fetch_services=False, max_workers=16):
+    """
+    Return a list of all nodes, from all providers.
+
+    The node inventory is cached for NODES_CACHE_TTL seconds, so that repeated
+    lookups within a single command do not each query the cloud APIs.
+
+    :param force: ignore the cached inventory and query the providers again.
+    :param fetch_services: also query each node for its running services, and store
+                           them in `node.live_services`.
+                           The nodes are queried concurrently.
+    :param max_workers: the maximum number of nodes queried at the same time.
+    """
+    if force or not _have_nodes_cache():
+        _refresh_nodes_cache()
+    nodes = _nodes_cache["nodes"]
+    if fetch_services:
+        listable = [node for node in nodes if node.can_list_services]
+        if listable:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(listable))) as executor:
+                fetched = executor.map(lambda node: node.services(update=True), listable)
+                for node, services in zip(listable, fetched):
+                    node.live_services = services
+    return nodes
 
 
 def get_node(name):
     """Get a node by name."""
-    all_nodes = list_nodes()
-    for node in all_nodes:
-        if node.name == name:
-            return node
-    raise Exception("No such node: {}".format(name))
+    if not _have_nodes_cache():
+        # ask DigitalOcean for this droplet only, which avoids enumerating
+        # every provider when the node is a droplet
+        droplets = get_do_manager().get_all_droplets(params={"name": name})
+        # the filter may not be exact (e.g. it may ignore case), so check the names ourselves
+        matches = [droplet for droplet in droplets if droplet.name == name]
+        if matches:
+            return DigitalOceanNode.from_droplet(matches[0])
+    list_nodes()  # ensures the index by name is up-to-date
+    try:
+        return _nodes_cache["nodes_by_name"][name]
+    except KeyError:
+        raise Exception("No such node: {}".format(name))
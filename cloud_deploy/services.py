@@ -6,17 +6,45 @@ e.g. a web server or a database.
 from __future__ import print_function, unicode_literals
 import os.path
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 import logging
 from warnings import warn
 import json
+import shlex
 import socket
 import yaml
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:  # PyYAML built without libyaml
+    from yaml import SafeLoader
 import spur
+try:
+    import orjson
+except ImportError:  # optional, only makes JSON parsing and serialization faster
+    orjson = None
 
 logger = logging.getLogger("deploy")
 reverse_dns_lookup = {}
+# (attribute, column title) for the first columns of Service.as_dict()
+_SERVICE_FIELDS = tuple((attr, attr.title()) for attr in ("name", "image", "status", "url"))
 
 
+def json_loads(s):
+    """Parse JSON from a str or bytes, using orjson if it is installed."""
+    if orjson is None:
+        return json.loads(s)
+    return orjson.loads(s)
+
+
+def json_dumps(obj):
+    """Serialize `obj` as compact JSON, returned as bytes, using orjson if it is installed."""
+    if orjson is None:
+        return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+    return orjson.dumps(obj)
+
+
+@lru_cache(maxsize=1)
 def get_config_file():
     if os.path.exists("config.yml"):
         return "config.yml"
@@ -24,19 +52,33 @@ def get_config_file():
         return os.path.expanduser("~/.cld-config.yml")
 
 
-def build_reverse_lookup():
-    global reverse_dns_lookup
+@lru_cache(maxsize=1)
+def get_config():
+    """Return the parsed contents of the configuration file."""
     with open(get_config_file()) as fp:
-        config = yaml.safe_load(fp)
+        return yaml.load(fp, Loader=SafeLoader)
 
-    urls = config.get("URLS", [])
-    for url in urls:
-        try:
-            ip_addr = socket.gethostbyname(url)
-        except Exception:
-            pass
-        else:
-            reverse_dns_lookup[ip_addr] = url
+
+def _resolve(url):
+    """Return the set of IP addresses (v4 and v6) for a host name."""
+    try:
+        infos = socket.getaddrinfo(url, None, type=socket.SOCK_STREAM)
+    except Exception:
+        return set()
+    return set(info[4][0] for info in infos)
+
+
+@lru_cache(maxsize=1)
+def build_reverse_lookup():
+    global reverse_dns_lookup
+    urls = get_config().get("URLS", [])
+    if not urls:
+        return
+    # DNS lookups block, so we run them concurrently
+    with ThreadPoolExecutor(max_workers=min(32, len(urls))) as executor:
+        for url, ip_addrs in zip(urls, executor.map(_resolve, urls)):
+            for ip_addr in ip_addrs:
+                reverse_dns_lookup[ip_addr] = url
 
 
 class Service(object):
@@ -59,8 +101,8 @@ class Service(object):
         return "{} ({}); {}".format(self.name, self.image, self.status)
 
     def as_dict(self):
-        d = OrderedDict((key.title(), str(getattr(self, key)))
-                        for key in ["name", "image", "status", "url"])
+        d = OrderedDict((title, str(getattr(self, attr)))
+                        for attr, title in _SERVICE_FIELDS)
         d["IP"] = self.node.ip_address
         #d["ID"] = self.id[:12]
         d["Node"] = self.node.name
@@ -69,25 +111,33 @@ class Service(object):
 
     @property
     def url(self):
-        if not reverse_dns_lookup:
-            build_reverse_lookup()
+        build_reverse_lookup()  # only does the lookups the first time
         return reverse_dns_lookup.get(self.node.ip_address, "")
 
     @classmethod
     def from_json(cls, s, node):
-        data = json.loads(s)[0]
+        """
+        Create a Service from the output of `docker inspect` for a single container.
+
+        When the output has already been parsed, use `from_dict()` instead.
+        """
         logger.debug(s)
+        return cls.from_dict(json_loads(s)[0], node)
+
+    @classmethod
+    def from_dict(cls, data, node):
+        """
+        Create a Service from one element of the output of `docker inspect`.
+        """
         raw_ports = data["NetworkSettings"]["Ports"]
         ports = {}
         for k, v in raw_ports.items():
             if v is not None:
-                ports[k.split("/")[0]] = v[0]['HostPort']
+                ports[k.partition("/")[0]] = v[0]['HostPort']
         raw_env = data["Config"]["Env"]
         env = {}
         for item in raw_env:
-            parts = item.split("=")
-            k = parts[0]
-            v = "".join(parts[1:])
+            k, _, v = item.partition("=")
             env[k] = v
         volumes = []
         volume_data = data["HostConfig"]["Binds"]
@@ -108,11 +158,11 @@ class Service(object):
         return obj
 
     def start(self):
-        response = self.node._remote_execute("docker start {}".format(self.id))
+        response = self.node._remote_execute(["docker", "start", self.id])
         self.update_status()
 
     def stop(self):
-        response = self.node._remote_execute("docker stop {}".format(self.id))
+        response = self.node._remote_execute(["docker", "stop", self.id])
         self.update_status()
 
     def terminate(self):
@@ -120,47 +170,44 @@ class Service(object):
         return response
 
     def logs(self, filename=None, append=False):
-        response = self.node._remote_execute("docker logs {}".format(self.id))
+        cmd = ["docker", "logs", self.id]
         if filename:
-            with open(filename, mode=append and "a" or "w") as fp:
-                fp.write(response)
+            # the log can be large, so it is streamed into the file rather than read into memory
+            with open(filename, mode=append and "ab" or "wb") as fp:
+                self.node._remote_execute(cmd, sink=fp)
             return filename
         else:
-            return response
+            return self.node._remote_execute(cmd)
 
     def update_status(self):
-        response = self.node._remote_execute("docker inspect {}".format(self.id))
-        data = json.loads(response)[0]
+        response = self.node._remote_execute(["docker", "inspect", self.id])
+        data = json_loads(response)[0]
         self.status = data["State"]["Status"]
 
     def launch(self):
         """Launch a new instance of the service."""
-        self.node.pull(self.image)
-        ports_str = ""
-        if self.ports:
-            for p1, p2 in self.ports.items():
-                #ports_str += "-p {}:{} ".format(p1.split("/")[0], p2.split("/")[0])
-                if p2 is None:
-                    ports_str += "-p {}".format(p1)
-                else:
-                    ports_str += "-p {}:{} ".format(p1, p2)
-        env_str = ""
-        if self.env:
-            for name, val in self.env.items():
-                env_str += '-e "{}={}" '.format(name, val)
-        vol_str = ""
-        if self.volumes:
-            for dir_name in self.volumes:
-                vol_str += '-v {}:{}'.format(dir_name, dir_name)
-        cmd = "docker run -d --name={} {} {} {} {}".format(self.name, ports_str, env_str, vol_str, self.image)
-        print(cmd)
-        response = self.node._remote_execute(cmd)
+        if not self.node.pull(self.image):
+            raise Exception("Unable to pull image {} on {}".format(self.image, self.node.name))
+        argv = ["docker", "run", "-d", "--name={}".format(self.name)]
+        for p1, p2 in (self.ports or {}).items():
+            if p2 is None:
+                argv += ["-p", "{}".format(p1)]
+            else:
+                argv += ["-p", "{}:{}".format(p1, p2)]
+        for name, val in (self.env or {}).items():
+            argv += ["-e", "{}={}".format(name, val)]
+        for dir_name in (self.volumes or ()):
+            argv += ["-v", "{}:{}".format(dir_name, dir_name)]
+        argv.append(self.image)
+        print(" ".join(shlex.quote(arg) for arg in argv))
+        response = self.node._remote_execute(argv)
         self.id = response.strip()
         self.update_status()
 
     def redeploy(self):
         """Redeploy the service with the latest image."""
-        self.node.pull(self.image)
+        if not self.node.pull(self.image):
+            raise Exception("Unable to pull image {} on {}".format(self.image, self.node.name))
         self.stop()
         self.node.rename_service(self.name, self.name + "-old")
         old_id = self.id
@@ -8,8 +8,9 @@ with open('README.rst') as readme_file:
 
 requirements = [
     'click',
-    'python-digitalocean',
+    'python-digitalocean>=1.15',
     'spur',
+    'paramiko',
     'tabulate',
     'sphinx',
     'pyyaml',
@@ -38,6 +39,9 @@ setup(
     },
     include_package_data=True,
     install_requires=requirements,
+    extras_require={
+        'fast': ['orjson'],
+    },
     license="Apache Software License 2.0",
     zip_safe=False,
     keywords='cloud Docker',